@@ -5,25 +5,263 @@ Combines scraping and autonomous interaction using MultiOn
 """
 
 import asyncio
-import json
+import atexit
 import os
 import base64
+import re
+import threading
 import time
-from flask import Flask, render_template, request, jsonify
+from collections import OrderedDict
+from typing import Literal
+from urllib.parse import urlsplit
+import aiohttp
+import orjson
+import xxhash
+from flask import Flask, render_template, request, Response
 from dotenv import load_dotenv
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 from pydantic import BaseModel
-import nest_asyncio
 from playwright.async_api import async_playwright
+from selectolax.parser import HTMLParser
 
 # Load environment variables
 load_dotenv()
-
-# Apply nest_asyncio for Flask compatibility
-nest_asyncio.apply()
+API_KEY = os.getenv('OPENAI_API_KEY') or "YOUR_OPENAI_API_KEY_HERE"
 
 app = Flask(__name__)
 
+# One long-lived background event loop shared by every request. Running
+# async code here (instead of asyncio.run per request) avoids per-request
+# loop setup and keeps the shared browser pool alive across requests.
+_LOOP = asyncio.new_event_loop()
+threading.Thread(target=_LOOP.run_forever, daemon=True).start()
+
+# Bound how many browser contexts can run at once
+_CONTEXT_SEMAPHORE = asyncio.Semaphore(int(os.getenv('AGENT_MAX_CONCURRENCY', '4')))
+
+def run_async(coro):
+    """Run a coroutine on the shared background loop from a sync Flask view"""
+    return asyncio.run_coroutine_threadsafe(coro, _LOOP).result()
+
+# One async OpenAI client for the whole process. Async matters here: the
+# SDK's sync client would block the shared loop for the full duration of
+# every LLM call, stalling every other in-flight request.
+OPENAI_CLIENT = AsyncOpenAI(
+    api_key=API_KEY,
+    http_client=httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=8),
+    ),
+)
+
+def json_response(obj, status=200):
+    """Serialize with orjson (C) - Flask's jsonify is pure Python and slow
+    for the multi-MB base64 screenshots these responses carry"""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json')
+
+# Resource types to abort before navigation (speeds up page loads a lot).
+# Override with a comma-separated PLAYWRIGHT_BLOCK_TYPES env var.
+def _blocked_resource_types(default):
+    env_types = os.getenv('PLAYWRIGHT_BLOCK_TYPES')
+    if env_types:
+        return {t.strip() for t in env_types.split(',') if t.strip()}
+    return default
+
+# Keep stylesheets for the autonomous agent so its screenshots stay useful
+AGENT_BLOCK_TYPES = _blocked_resource_types({"image", "font", "media"})
+SCRAPER_BLOCK_TYPES = _blocked_resource_types({"image", "stylesheet", "font", "media"})
+
+# Fallback wait (ms) when the page never signals readiness
+PLAYWRIGHT_WAIT_MS = int(os.getenv('PLAYWRIGHT_WAIT_MS', '500'))
+
+# Hot-path constants for execute_action
+_FILL_SELECTORS_TMPL = (
+    "input[name='{name}']",
+    "input[id='{name}']",
+    "input[type='{name}']",
+)
+
+BROWSER_ARGS = [
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-setuid-sandbox",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling"
+]
+
+# Shared Playwright driver and browsers: starting Playwright and launching
+# Chromium cost seconds per request, so keep one browser per headless flag
+# and give each agent its own isolated context instead.
+_PLAYWRIGHT = None
+_BROWSERS = {}
+_BROWSER_LOCK = asyncio.Lock()
+
+async def _get_browser(headless):
+    """Lazily start Playwright once and share one browser per headless flag"""
+    global _PLAYWRIGHT
+    async with _BROWSER_LOCK:
+        if _PLAYWRIGHT is None:
+            _PLAYWRIGHT = await async_playwright().start()
+        browser = _BROWSERS.get(headless)
+        if browser is None or not browser.is_connected():
+            browser = await _PLAYWRIGHT.chromium.launch(headless=headless, args=BROWSER_ARGS)
+            _BROWSERS[headless] = browser
+        return browser
+
+async def _close_browsers():
+    global _PLAYWRIGHT
+    for browser in _BROWSERS.values():
+        try:
+            await browser.close()
+        except Exception:
+            pass
+    _BROWSERS.clear()
+    if _PLAYWRIGHT is not None:
+        try:
+            await _PLAYWRIGHT.stop()
+        except Exception:
+            pass
+        _PLAYWRIGHT = None
+
+def _shutdown_browsers():
+    if _PLAYWRIGHT is None:
+        return
+    try:
+        # Bounded so a half-dead driver can't hang interpreter shutdown
+        asyncio.run_coroutine_threadsafe(_close_browsers(), _LOOP).result(timeout=5)
+    except Exception:
+        pass
+
+atexit.register(_shutdown_browsers)
+
+# Bounded LRU+TTL cache for LLM calls: repeated steps on an unchanged page
+# and repeat scrapes of the same content should not pay the model twice.
+_LLM_CACHE = OrderedDict()
+_LLM_CACHE_LOCK = asyncio.Lock()
+LLM_CACHE_SIZE = 256
+LLM_CACHE_TTL = 600  # seconds
+
+def _cache_key(*parts):
+    return xxhash.xxh3_128("\x00".join(parts).encode()).hexdigest()
+
+async def _cache_get(key):
+    async with _LLM_CACHE_LOCK:
+        entry = _LLM_CACHE.get(key)
+        if entry is None:
+            return None
+        timestamp, value = entry
+        if time.time() - timestamp > LLM_CACHE_TTL:
+            del _LLM_CACHE[key]
+            return None
+        _LLM_CACHE.move_to_end(key)
+        return value
+
+async def _cache_put(key, value):
+    async with _LLM_CACHE_LOCK:
+        _LLM_CACHE[key] = (time.time(), value)
+        _LLM_CACHE.move_to_end(key)
+        while len(_LLM_CACHE) > LLM_CACHE_SIZE:
+            _LLM_CACHE.popitem(last=False)
+
+# Pool of warm agent sessions keyed by URL origin so repeat /autonomous
+# calls against the same site skip the cold navigation.
+_SESSION_POOL = OrderedDict()
+_SESSION_POOL_LOCK = asyncio.Lock()
+SESSION_POOL_SIZE = 4
+SESSION_POOL_TTL = 120  # seconds
+
+async def _checkout_agent(url):
+    """Reuse a pooled agent for this origin, or hand back a fresh one"""
+    origin = urlsplit(url).netloc
+    async with _SESSION_POOL_LOCK:
+        entry = _SESSION_POOL.pop(origin, None)
+    if entry is not None:
+        agent, pooled_at = entry
+        if time.time() - pooled_at <= SESSION_POOL_TTL and agent.page:
+            return origin, agent
+        await agent.close_session()
+    return origin, MockMultiOnClient()
+
+async def _checkin_agent(origin, agent):
+    """Park a healthy agent for its origin, evicting the oldest if full"""
+    if not agent.page:
+        return
+    evicted = []
+    async with _SESSION_POOL_LOCK:
+        old = _SESSION_POOL.pop(origin, None)
+        if old is not None:
+            evicted.append(old[0])
+        _SESSION_POOL[origin] = (agent, time.time())
+        while len(_SESSION_POOL) > SESSION_POOL_SIZE:
+            _, (stale, _) = _SESSION_POOL.popitem(last=False)
+            evicted.append(stale)
+    for stale in evicted:
+        try:
+            await stale.close_session()
+        except Exception:
+            pass
+
+async def _reap_expired_sessions():
+    """Background task on the shared loop: close pooled sessions past TTL"""
+    while True:
+        await asyncio.sleep(60)
+        now = time.time()
+        async with _SESSION_POOL_LOCK:
+            expired = [origin for origin, (_, pooled_at) in _SESSION_POOL.items()
+                       if now - pooled_at > SESSION_POOL_TTL]
+            agents = [_SESSION_POOL.pop(origin)[0] for origin in expired]
+        for agent in agents:
+            try:
+                await agent.close_session()
+            except Exception:
+                pass
+
+asyncio.run_coroutine_threadsafe(_reap_expired_sessions(), _LOOP)
+
+# Conditional-GET cache for /scrape: when the origin still serves the same
+# ETag/Last-Modified, the cached extraction is returned without launching
+# a browser or calling the model at all.
+_SCRAPE_CACHE = OrderedDict()
+_SCRAPE_CACHE_LOCK = asyncio.Lock()
+SCRAPE_CACHE_SIZE = 64
+
+async def _scrape_cache_fresh(url, instructions):
+    """Return the cached result if the origin reports the page unchanged"""
+    async with _SCRAPE_CACHE_LOCK:
+        entry = _SCRAPE_CACHE.get((url, instructions))
+    if entry is None:
+        return None
+    etag, last_modified, result = entry
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    try:
+        timeout = aiohttp.ClientTimeout(total=5)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.head(url, headers=headers, allow_redirects=True) as response:
+                if response.status == 304:
+                    return result
+    except Exception:
+        pass  # origin unreachable or doesn't support HEAD - scrape normally
+    return None
+
+async def _scrape_cache_store(url, instructions, response_headers, result):
+    """Remember the validators + result for pages that advertise them"""
+    etag = response_headers.get("etag", "")
+    last_modified = response_headers.get("last-modified", "")
+    if not etag and not last_modified:
+        return
+    async with _SCRAPE_CACHE_LOCK:
+        _SCRAPE_CACHE[(url, instructions)] = (etag, last_modified, result)
+        _SCRAPE_CACHE.move_to_end((url, instructions))
+        while len(_SCRAPE_CACHE) > SCRAPE_CACHE_SIZE:
+            _SCRAPE_CACHE.popitem(last=False)
+
 # Data models for scraping
 class ExtractedData(BaseModel):
     title: str
@@ -35,6 +273,16 @@ class ExtractionResult(BaseModel):
     items: list[ExtractedData]
 
 # Data models for autonomous actions
+class AgentAction(BaseModel):
+    verb: Literal["CLICK", "FILL", "SCROLL", "NAVIGATE", "SEARCH",
+                  "TASK_COMPLETE", "TASK_FAILED"]
+    target: str = ""
+    value: str = ""
+
+    def label(self):
+        """Human-readable form for step logs and loop detection"""
+        return " ".join(part for part in (self.verb, self.target, self.value) if part)
+
 class ActionStep(BaseModel):
     step_number: int
     action: str
@@ -53,8 +301,7 @@ class MockMultiOnClient:
     """A mock client that simulates MultiOn functionality using Playwright"""
     
     def __init__(self):
-        self.playwright = None
-        self.browser = None
+        self.context = None
         self.page = None
         self.session_id = None
         self.current_url = None
@@ -62,27 +309,33 @@ class MockMultiOnClient:
         self.step_count = 0
 
     async def init_browser(self):
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(
-            headless=False,  # Show browser for autonomous actions
-            args=[
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-                "--disable-setuid-sandbox"
-            ]
+        # Headless by default (much cheaper and container-friendly);
+        # set AGENT_HEADFUL=1 to watch the agent work
+        headful = os.getenv("AGENT_HEADFUL", "0") == "1"
+        browser = await _get_browser(headless=not headful)
+        self.context = await browser.new_context()
+        self.page = await self.context.new_page()
+        # Abort non-essential resource loads so navigation settles faster
+        await self.page.route(
+            "**/*",
+            lambda route: route.abort()
+            if route.request.resource_type in AGENT_BLOCK_TYPES
+            else route.continue_()
         )
-        self.page = await self.browser.new_page()
 
     async def create_session(self, url):
         """Create a new agent session"""
-        if not self.page:
+        if not self.page or self.page.is_closed():
             await self.init_browser()
         
-        await self.page.goto(url, wait_until="load", timeout=30000)
-        await self.page.wait_for_timeout(2000)
+        # A pooled session may already be on the requested page
+        if self.page.url != url:
+            await self.page.goto(url, wait_until="load", timeout=30000)
+            await self.page.wait_for_timeout(2000)
         
         self.session_id = f"session_{int(time.time())}"
         self.current_url = url
+        self.step_count = 0
         self.screenshot = await self.take_screenshot()
         
         return {
@@ -92,19 +345,13 @@ class MockMultiOnClient:
             "status": "CONTINUE"
         }
 
-    async def execute_task(self, task, openai_client):
+    async def execute_task(self, task, openai_client, capture_screenshot=True):
         """Execute a task using AI to determine actions"""
         if not self.page:
             raise ValueError("No active session. Call create_session first.")
         
-        # Take screenshot for current state
-        screenshot = await self.take_screenshot()
-        
-        # Get page content for context
-        page_content = await self.page.content()
-        
         # Use OpenAI to determine what action to take
-        action = await self.determine_action(task, page_content, openai_client)
+        action = await self.determine_action(task, openai_client)
         
         # Execute the determined action
         result = await self.execute_action(action)
@@ -113,58 +360,55 @@ class MockMultiOnClient:
         
         return {
             "step": self.step_count,
-            "action": action,
+            "action": action.label(),
             "url": self.current_url,
-            "screenshot": await self.take_screenshot(),
+            "screenshot": await self.take_screenshot() if capture_screenshot else "",
             "status": result.get("status", "CONTINUE"),
             "message": result.get("message", "")
         }
 
-    async def determine_action(self, task, page_content, openai_client):
+    async def determine_action(self, task, openai_client):
         """Use OpenAI to determine what action to take"""
         
-        # Extract key elements from the page for better decision making
-        visible_text = await self.page.evaluate("""
-            () => {
-                const walker = document.createTreeWalker(
-                    document.body,
-                    NodeFilter.SHOW_TEXT,
-                    null,
-                    false
-                );
-                let text = '';
-                let node;
-                while (node = walker.nextNode()) {
-                    if (node.parentElement.offsetParent !== null) {
-                        text += node.textContent.trim() + ' ';
-                    }
-                }
-                return text.slice(0, 2000);
-            }
-        """)
-        
-        # Get interactive elements
-        interactive_elements = await self.page.evaluate("""
-            () => {
-                const elements = [];
-                const selectors = ['button', 'a', 'input', 'select', 'textarea'];
-                selectors.forEach(selector => {
-                    document.querySelectorAll(selector).forEach((el, i) => {
-                        if (el.offsetParent !== null && i < 10) {
-                            elements.push({
-                                tag: el.tagName.toLowerCase(),
-                                text: el.textContent?.trim() || el.value || el.placeholder || '',
-                                type: el.type || '',
-                                name: el.name || '',
-                                id: el.id || '',
-                                href: el.href || ''
-                            });
+        # Let the browser's native (C++) text extraction produce the visible
+        # text and fetch the interactive elements concurrently. The elements
+        # come back as parallel columns - far cheaper to serialize and to
+        # format for the prompt than an array of keyed objects.
+        visible_text, elements = await asyncio.gather(
+            self.page.inner_text("body"),
+            self.page.evaluate("""
+                () => {
+                    const tags = [], texts = [], types = [], names = [], ids = [], hrefs = [];
+                    document.querySelectorAll('button, a, input, select, textarea').forEach(el => {
+                        if (el.offsetParent !== null && tags.length < 50) {
+                            tags.push(el.tagName.toLowerCase());
+                            texts.push(el.textContent?.trim() || el.value || el.placeholder || '');
+                            types.push(el.type || '');
+                            names.push(el.name || '');
+                            ids.push(el.id || '');
+                            hrefs.push(el.href || '');
                         }
                     });
-                });
-                return elements;
-            }
-        """)
+                    return {tags, texts, types, names, ids, hrefs};
+                }
+            """)
+        )
+        visible_text = visible_text[:2000]
+        
+        # Compact one-row-per-element table: no repeated JSON keys/indent
+        elements_table = "\n".join(
+            f"{i}|{tag}|{text[:40]}|{typ}|{name}|{id_}|{href[:60]}"
+            for i, (tag, text, typ, name, id_, href) in enumerate(zip(
+                elements["tags"][:15], elements["texts"][:15], elements["types"][:15],
+                elements["names"][:15], elements["ids"][:15], elements["hrefs"][:15]
+            ))
+        )
+        
+        # Same task on an effectively unchanged page -> reuse the last decision
+        cache_key = _cache_key(task, visible_text[:1500], elements_table)
+        action = await _cache_get(cache_key)
+        if action is not None:
+            return self._cap_exploration(action)
         
         prompt = f"""
         You are an AUTONOMOUS web agent. Your goal: "{task}"
@@ -175,253 +419,224 @@ class MockMultiOnClient:
         VISIBLE PAGE CONTENT:
         {visible_text[:1500]}
         
-        INTERACTIVE ELEMENTS FOUND:
-        {json.dumps(interactive_elements[:15], indent=2)}
-        
-        BE PROACTIVE! Think step-by-step:
-        1. What does the task require?
-        2. What information is visible on this page?
-        3. What action will help complete the task?
-        4. Should I scroll to see more content?
-        5. Should I click something to navigate?
-        
-        AVAILABLE ACTIONS:
-        - CLICK button 'Text' - Click a button with specific text
-        - CLICK link 'Text' - Click a link with specific text  
-        - FILL field_name value - Fill a form field
-        - SCROLL - Scroll down to see more content
-        - NAVIGATE url - Go to a specific URL
-        - SEARCH text - Look for specific text/content
-        - TASK_COMPLETE - Task is finished successfully
-        - TASK_FAILED - Cannot complete task
-        
-        DECISION RULES:
-        - If task asks to "find" or "get" information: ACTIVELY look around the page, scroll if needed
-        - If you don't see what you need: SCROLL down to explore more
-        - If task involves courses/products: Look for navigation links, click relevant sections
-        - If task asks for specific content: Search the page thoroughly before giving up
-        - If you find relevant links: CLICK them to explore
-        - If page has limited content: SCROLL to see more
-        - Only say TASK_COMPLETE when you've actually found/done what was requested
-        
-        EXAMPLES:
-        Task: "Get list of courses" → SCROLL (to see more courses) or CLICK link 'View All Courses'
-        Task: "Find RAG course" → SCROLL or CLICK link containing 'RAG' or 'Retrieval'
-        Task: "Subscribe to newsletter" → Look for email field, FILL it, then CLICK subscribe
-        
-        Choose the MOST HELPFUL action to progress toward completing: "{task}"
-        Be PROACTIVE and EXPLORATORY, not passive!
+        INTERACTIVE ELEMENTS FOUND (index|tag|text|type|name|id|href):
+        {elements_table}
+        
+        Pick the single most helpful next action:
+        - CLICK: target = visible text of the button or link
+        - FILL: target = field name, value = text to enter
+        - NAVIGATE: target = absolute URL to open
+        - SEARCH: target = text to search the page for
+        - SCROLL: scroll down to see more content
+        - TASK_COMPLETE / TASK_FAILED: only when the task is truly done or impossible
+        
+        Be proactive and exploratory: scroll and click through relevant
+        links rather than giving up, and only return TASK_COMPLETE once
+        you have actually found or done what was requested.
         """
         
         try:
-            response = openai_client.chat.completions.create(
+            response = await openai_client.beta.chat.completions.parse(
                 model="gpt-4o-mini",
                 messages=[{"role": "user", "content": prompt}],
                 max_tokens=100,
-                temperature=0.1
+                temperature=0.1,
+                response_format=AgentAction,
             )
-            action = response.choices[0].message.content.strip()
-            
-            # Encourage exploration, but prevent infinite loops
-            if self.step_count >= 8 and "TASK_COMPLETE" not in action and "TASK_FAILED" not in action:
-                return "TASK_COMPLETE"
-            
-            return action
+            action = response.choices[0].message.parsed
+            await _cache_put(cache_key, action)
+            return self._cap_exploration(action)
         except Exception as e:
-            return "TASK_FAILED"
+            return AgentAction(verb="TASK_FAILED")
+
+    def _cap_exploration(self, action):
+        """Encourage exploration, but prevent infinite loops"""
+        if self.step_count >= 8 and action.verb not in ("TASK_COMPLETE", "TASK_FAILED"):
+            return AgentAction(verb="TASK_COMPLETE")
+        return action
+
+    async def _settle(self, timeout=3000):
+        """Wait for the page to settle after an action instead of a fixed sleep"""
+        try:
+            await self.page.wait_for_load_state("domcontentloaded", timeout=timeout)
+        except Exception:
+            # Page is still busy - fall back to a short fixed wait
+            await self.page.wait_for_timeout(PLAYWRIGHT_WAIT_MS)
 
     async def execute_action(self, action):
         """Execute the determined action"""
         try:
-            action_upper = action.upper()
-            
-            if "TASK_COMPLETE" in action_upper:
+            if action.verb == "TASK_COMPLETE":
                 return {"status": "COMPLETE", "message": "Task completed successfully"}
             
-            elif "TASK_FAILED" in action_upper:
+            if action.verb == "TASK_FAILED":
                 return {"status": "FAILED", "message": "Task failed - could not complete"}
             
-            elif action_upper.startswith("CLICK"):
-                # Parse click command: "CLICK button 'Submit'" or "CLICK link 'Courses'"
-                try:
-                    # Try to find and click the specific element
-                    if "button" in action.lower():
-                        # Extract button text if specified
-                        if "'" in action:
-                            button_text = action.split("'")[1]
-                            buttons = await self.page.query_selector_all("button")
-                            for button in buttons:
-                                text = await button.text_content()
-                                if button_text.lower() in text.lower():
-                                    await button.click()
-                                    await self.page.wait_for_timeout(2000)
-                                    return {"status": "CONTINUE", "message": f"Clicked button: {button_text}"}
-                        
-                        # Fallback: click first button
-                        button = await self.page.query_selector("button")
-                        if button:
-                            await button.click()
-                            await self.page.wait_for_timeout(2000)
-                            return {"status": "CONTINUE", "message": "Clicked first button"}
-                    
-                    elif "link" in action.lower():
-                        # Extract link text if specified
-                        if "'" in action:
-                            link_text = action.split("'")[1]
-                            links = await self.page.query_selector_all("a")
-                            for link in links:
-                                text = await link.text_content()
-                                if link_text.lower() in text.lower():
-                                    await link.click()
-                                    await self.page.wait_for_timeout(3000)
-                                    return {"status": "CONTINUE", "message": f"Clicked link: {link_text}"}
-                        
-                        # Fallback: click first link
-                        link = await self.page.query_selector("a")
-                        if link:
-                            await link.click()
-                            await self.page.wait_for_timeout(3000)
-                            return {"status": "CONTINUE", "message": "Clicked first link"}
-                    
-                    return {"status": "CONTINUE", "message": "No suitable element found to click"}
-                    
-                except Exception as e:
-                    return {"status": "ERROR", "message": f"Click failed: {str(e)}"}
+            handler = self._ACTION_HANDLERS.get(action.verb, MockMultiOnClient._do_explore)
+            return await handler(self, action)
+                
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Action execution failed: {str(e)}"}
+
+    async def _do_click(self, action):
+        try:
+            target = action.target.strip()
+            if target:
+                # The locator matches text in-browser instead of one CDP
+                # round-trip per candidate element
+                pattern = re.compile(re.escape(target), re.IGNORECASE)
+                for role in ("button", "link"):
+                    locator = self.page.get_by_role(role, name=pattern).first
+                    try:
+                        await locator.click(timeout=3000)
+                        await self._settle()
+                        return {"status": "CONTINUE", "message": f"Clicked {role}: {target}"}
+                    except Exception:
+                        continue  # no match in time - try the next role
             
-            elif action_upper.startswith("FILL"):
-                # Parse fill command: "FILL email test@example.com"
-                try:
-                    parts = action.split()
-                    if len(parts) >= 3:
-                        field_name = parts[1]
-                        value = " ".join(parts[2:])
-                        
-                        # Try to find field by name, id, or type
-                        selectors = [
-                            f"input[name='{field_name}']",
-                            f"input[id='{field_name}']",
-                            f"input[type='{field_name}']",
-                            "input[type='email']" if field_name == "email" else "",
-                            "input[type='text']" if field_name in ["text", "name"] else ""
-                        ]
-                        
-                        for selector in selectors:
-                            if selector:
-                                element = await self.page.query_selector(selector)
-                                if element:
-                                    await element.fill(value)
-                                    await self.page.wait_for_timeout(1000)
-                                    return {"status": "CONTINUE", "message": f"Filled {field_name} with {value}"}
-                        
-                        # Fallback: fill first input
-                        input_field = await self.page.query_selector("input[type='text'], input[type='email'], textarea")
-                        if input_field:
-                            await input_field.fill(value)
-                            await self.page.wait_for_timeout(1000)
-                            return {"status": "CONTINUE", "message": f"Filled field with {value}"}
-                    
-                    return {"status": "CONTINUE", "message": "Could not parse fill command"}
-                    
-                except Exception as e:
-                    return {"status": "ERROR", "message": f"Fill failed: {str(e)}"}
+            # No blind fallback click: report the miss so the next
+            # determine_action round can pick a different element
+            return {"status": "CONTINUE", "message": f"No clickable element matching '{target}' found"}
             
-            elif action_upper.startswith("SCROLL"):
-                await self.page.evaluate("window.scrollBy(0, 500)")
-                await self.page.wait_for_timeout(2000)
-                return {"status": "CONTINUE", "message": "Scrolled down to explore more content"}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Click failed: {str(e)}"}
+
+    async def _do_fill(self, action):
+        try:
+            field_name = action.target.strip()
+            value = action.value
+            if field_name and value:
+                # Try to find field by name, id, or type
+                selectors = [tmpl.format(name=field_name) for tmpl in _FILL_SELECTORS_TMPL]
+                if field_name == "email":
+                    selectors.append("input[type='email']")
+                elif field_name in ["text", "name"]:
+                    selectors.append("input[type='text']")
+                
+                for selector in selectors:
+                    element = await self.page.query_selector(selector)
+                    if element:
+                        await element.fill(value)
+                        try:
+                            await element.wait_for_element_state("stable", timeout=1000)
+                        except Exception:
+                            pass  # fill already landed; stability is best-effort
+                        return {"status": "CONTINUE", "message": f"Filled {field_name} with {value}"}
+                
+                # Fallback: fill first input
+                input_field = await self.page.query_selector("input[type='text'], input[type='email'], textarea")
+                if input_field:
+                    await input_field.fill(value)
+                    try:
+                        await input_field.wait_for_element_state("stable", timeout=1000)
+                    except Exception:
+                        pass  # fill already landed; stability is best-effort
+                    return {"status": "CONTINUE", "message": f"Filled field with {value}"}
+                
+                return {"status": "CONTINUE", "message": f"No input field found for {field_name}"}
             
-            elif action_upper.startswith("NAVIGATE"):
-                # Parse navigate command: "NAVIGATE https://example.com"
-                try:
-                    if "http" in action:
-                        url = action.split("http")[1]
-                        if not url.startswith("://"):
-                            url = "http" + url
-                        await self.page.goto(url, wait_until="load", timeout=30000)
-                        await self.page.wait_for_timeout(3000)
-                        self.current_url = url
-                        return {"status": "CONTINUE", "message": f"Navigated to {url}"}
-                    else:
-                        return {"status": "CONTINUE", "message": "Invalid navigation URL"}
-                except Exception as e:
-                    return {"status": "ERROR", "message": f"Navigation failed: {str(e)}"}
+            return {"status": "CONTINUE", "message": "Missing field name or value for fill"}
             
-            elif action_upper.startswith("SEARCH"):
-                # Parse search command: "SEARCH machine learning"
-                try:
-                    search_text = action[6:].strip()  # Remove "SEARCH"
-                    
-                    # Look for search input and fill it
-                    search_input = await self.page.query_selector("input[type='search'], input[name*='search'], input[placeholder*='search']")
-                    if search_input:
-                        await search_input.fill(search_text)
-                        await self.page.keyboard.press("Enter")
-                        await self.page.wait_for_timeout(3000)
-                        return {"status": "CONTINUE", "message": f"Searched for: {search_text}"}
-                    else:
-                        # If no search box, just scroll to look for the text
-                        await self.page.evaluate("window.scrollBy(0, 300)")
-                        await self.page.wait_for_timeout(1000)
-                        return {"status": "CONTINUE", "message": f"Looking for: {search_text}"}
-                        
-                except Exception as e:
-                    return {"status": "ERROR", "message": f"Search failed: {str(e)}"}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Fill failed: {str(e)}"}
+
+    async def _do_scroll(self, action):
+        await self.page.evaluate("window.scrollBy(0, 500)")
+        await self.page.wait_for_timeout(PLAYWRIGHT_WAIT_MS)
+        return {"status": "CONTINUE", "message": "Scrolled down to explore more content"}
+
+    async def _do_navigate(self, action):
+        try:
+            url = action.target.strip() or action.value.strip()
+            if url.startswith("http"):
+                await self.page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                self.current_url = url
+                return {"status": "CONTINUE", "message": f"Navigated to {url}"}
+            else:
+                return {"status": "CONTINUE", "message": "Invalid navigation URL"}
+        except Exception as e:
+            return {"status": "ERROR", "message": f"Navigation failed: {str(e)}"}
+
+    async def _do_search(self, action):
+        try:
+            search_text = action.target.strip() or action.value.strip()
             
+            # Look for search input and fill it
+            search_input = await self.page.query_selector("input[type='search'], input[name*='search'], input[placeholder*='search']")
+            if search_input:
+                await search_input.fill(search_text)
+                await self.page.keyboard.press("Enter")
+                await self._settle()
+                return {"status": "CONTINUE", "message": f"Searched for: {search_text}"}
             else:
-                # Unknown action - be more exploratory
-                if self.step_count <= 3:
-                    # Early steps: explore by scrolling
-                    await self.page.evaluate("window.scrollBy(0, 400)")
-                    await self.page.wait_for_timeout(1500)
-                    return {"status": "CONTINUE", "message": f"Exploring page: {action}"}
-                else:
-                    # Later steps: just wait
-                    await self.page.wait_for_timeout(1000)
-                    return {"status": "CONTINUE", "message": f"Executed: {action}"}
+                # If no search box, just scroll to look for the text
+                await self.page.evaluate("window.scrollBy(0, 300)")
+                await self.page.wait_for_timeout(PLAYWRIGHT_WAIT_MS)
+                return {"status": "CONTINUE", "message": f"Looking for: {search_text}"}
                 
         except Exception as e:
-            return {"status": "ERROR", "message": f"Action execution failed: {str(e)}"}
+            return {"status": "ERROR", "message": f"Search failed: {str(e)}"}
+
+    async def _do_explore(self, action):
+        # Unrecognized verb - be more exploratory
+        if self.step_count <= 3:
+            # Early steps: explore by scrolling
+            await self.page.evaluate("window.scrollBy(0, 400)")
+            await self.page.wait_for_timeout(PLAYWRIGHT_WAIT_MS)
+            return {"status": "CONTINUE", "message": f"Exploring page: {action.label()}"}
+        else:
+            # Later steps: just wait
+            await self.page.wait_for_timeout(PLAYWRIGHT_WAIT_MS)
+            return {"status": "CONTINUE", "message": f"Executed: {action.label()}"}
+
+    _ACTION_HANDLERS = {
+        "CLICK": _do_click,
+        "FILL": _do_fill,
+        "SCROLL": _do_scroll,
+        "NAVIGATE": _do_navigate,
+        "SEARCH": _do_search,
+    }
 
     async def take_screenshot(self):
         """Take a screenshot and return as base64"""
         if self.page:
-            screenshot_bytes = await self.page.screenshot(type="png", full_page=False)
+            # JPEG encodes faster and ships a much smaller payload than PNG
+            screenshot_bytes = await self.page.screenshot(type="jpeg", quality=50, full_page=False)
             return base64.b64encode(screenshot_bytes).decode()
         return ""
 
     async def close_session(self):
-        """Close the current session"""
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
-        self.playwright = None
-        self.browser = None
+        """Close the current session (the shared browser stays up)"""
+        if self.context:
+            await self.context.close()
+        self.context = None
         self.page = None
 
 # Original WebScraper for data extraction
 class WebScraperAgent:
     def __init__(self):
-        self.playwright = None
-        self.browser = None
+        self.context = None
         self.page = None
+        self.last_headers = {}
 
     async def init_browser(self):
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(
-            headless=True,
-            args=[
-                "--disable-dev-shm-usage",
-                "--no-sandbox",
-                "--disable-setuid-sandbox"
-            ]
+        browser = await _get_browser(headless=True)
+        self.context = await browser.new_context()
+        self.page = await self.context.new_page()
+        # The LLM only reads HTML, so images and styling are wasted bandwidth
+        await self.page.route(
+            "**/*",
+            lambda route: route.abort()
+            if route.request.resource_type in SCRAPER_BLOCK_TYPES
+            else route.continue_()
         )
-        self.page = await self.browser.new_page()
 
     async def scrape_content(self, url):
         if not self.page or self.page.is_closed():
             await self.init_browser()
-        await self.page.goto(url, wait_until="load", timeout=30000)
+        response = await self.page.goto(url, wait_until="load", timeout=30000)
+        # Keep the validators so /scrape can answer from cache next time
+        self.last_headers = dict(response.headers) if response else {}
         await self.page.wait_for_timeout(3000)
         return await self.page.content()
 
@@ -430,14 +645,31 @@ class WebScraperAgent:
         return base64.b64encode(screenshot_bytes).decode()
 
     async def close(self):
-        if self.browser:
-            await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
+        if self.context:
+            await self.context.close()
+        self.context = None
+        self.page = None
+
+def _compact_html(html):
+    """Strip scripts, styles and other non-content tags so the token
+    budget sent to the model carries actual page content"""
+    try:
+        tree = HTMLParser(html)
+        tree.strip_tags(["script", "style", "noscript", "svg", "iframe"])
+        body = tree.body
+        compact = body.html if body is not None else tree.html
+        return compact or html
+    except Exception:
+        return html
 
 async def process_with_llm(client, html, instructions):
     """Process HTML content with OpenAI LLM for data extraction"""
-    completion = client.beta.chat.completions.parse(
+    html = _compact_html(html)[:40000]
+    cache_key = _cache_key(instructions, html)
+    cached = await _cache_get(cache_key)
+    if cached is not None:
+        return cached
+    completion = await client.beta.chat.completions.parse(
         model="gpt-4o-mini-2024-07-18",
         messages=[{
             "role": "system",
@@ -452,12 +684,14 @@ async def process_with_llm(client, html, instructions):
             """
         }, {
             "role": "user",
-            "content": html[:150000]
+            "content": html
         }],
         temperature=0.1,
         response_format=ExtractionResult,
     )
-    return completion.choices[0].message.parsed
+    result = completion.choices[0].message.parsed
+    await _cache_put(cache_key, result)
+    return result
 
 @app.route('/')
 def index():
@@ -473,23 +707,20 @@ def scrape_website():
         instructions = data.get('instructions', 'Extract all relevant data from this webpage')
         
         if not url:
-            return jsonify({'error': 'URL is required'}), 400
+            return json_response({'error': 'URL is required'}, status=400)
             
         if not url.startswith(('http://', 'https://')):
             url = 'https://' + url
         
-        # Get API key
-        api_key = os.getenv('OPENAI_API_KEY') or "YOUR_OPENAI_API_KEY_HERE"
-        
-        if not api_key or api_key == "your_openai_api_key_here":
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
+        if not API_KEY or API_KEY == "your_openai_api_key_here":
+            return json_response({'error': 'OpenAI API key not configured'}, status=500)
         
         # Run the scraping process
-        result = asyncio.run(scrape_process(api_key, url, instructions))
-        return jsonify(result)
+        result = run_async(scrape_process(url, instructions))
+        return json_response(result)
         
     except Exception as e:
-        return jsonify({'error': f'Scraping failed: {str(e)}'}), 500
+        return json_response({'error': f'Scraping failed: {str(e)}'}, status=500)
 
 @app.route('/autonomous', methods=['POST'])
 def autonomous_task():
@@ -499,37 +730,51 @@ def autonomous_task():
         url = data.get('url', '').strip()
         task = data.get('task', '')
         max_steps = data.get('max_steps', 5)
+        # all | first_last | none
+        screenshots = data.get('screenshots', 'first_last')
+        if screenshots not in ('all', 'first_last', 'none'):
+            screenshots = 'first_last'
         
         if not url or not task:
-            return jsonify({'error': 'URL and task are required'}), 400
+            return json_response({'error': 'URL and task are required'}, status=400)
             
         if not url.startswith(('http://', 'https://')):
             url = 'https://' + url
         
-        # Get API key
-        api_key = os.getenv('OPENAI_API_KEY') or "YOUR_OPENAI_API_KEY_HERE"
-        
-        if not api_key:
-            return jsonify({'error': 'OpenAI API key not configured'}), 500
+        if not API_KEY:
+            return json_response({'error': 'OpenAI API key not configured'}, status=500)
         
         # Run the autonomous process
-        result = asyncio.run(autonomous_process(api_key, url, task, max_steps))
-        return jsonify(result)
+        result = run_async(autonomous_process(url, task, max_steps, screenshots))
+        return json_response(result)
         
     except Exception as e:
-        return jsonify({'error': f'Autonomous task failed: {str(e)}'}), 500
+        return json_response({'error': f'Autonomous task failed: {str(e)}'}, status=500)
 
-async def scrape_process(api_key, url, instructions):
+async def scrape_process(url, instructions):
     """Async function to handle the scraping process"""
+    cached = await _scrape_cache_fresh(url, instructions)
+    if cached is not None:
+        return cached
+    
     scraper = WebScraperAgent()
-    client = OpenAI(api_key=api_key)
+    client = OPENAI_CLIENT
     
+    try:
+        async with _CONTEXT_SEMAPHORE:
+            return await _scrape_with_agent(scraper, client, url, instructions)
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    finally:
+        await scraper.close()
+
+async def _scrape_with_agent(scraper, client, url, instructions):
     try:
         html_content = await scraper.scrape_content(url)
         screenshot = await scraper.screenshot_buffer()
         result = await process_with_llm(client, html_content, instructions)
         
-        return {
+        payload = {
             'success': True,
             'type': 'scraping',
             'url': url,
@@ -537,16 +782,32 @@ async def scrape_process(api_key, url, instructions):
             'data': result.dict() if result else None,
             'raw_count': len(result.items) if result and result.items else 0
         }
+        await _scrape_cache_store(url, instructions, scraper.last_headers, payload)
+        return payload
         
     except Exception as e:
         return {'success': False, 'error': str(e)}
-    finally:
-        await scraper.close()
 
-async def autonomous_process(api_key, url, task, max_steps):
+async def autonomous_process(url, task, max_steps, screenshots="first_last"):
     """Async function to handle autonomous task execution"""
-    agent = MockMultiOnClient()
-    client = OpenAI(api_key=api_key)
+    origin, agent = await _checkout_agent(url)
+    client = OPENAI_CLIENT
+    
+    try:
+        async with _CONTEXT_SEMAPHORE:
+            result = await _autonomous_with_agent(agent, client, url, task, max_steps, screenshots)
+    except Exception as e:
+        await agent.close_session()
+        return {'success': False, 'error': str(e)}
+    
+    if result.get('success'):
+        # Keep the warm session around for the next call to this origin
+        await _checkin_agent(origin, agent)
+    else:
+        await agent.close_session()
+    return result
+
+async def _autonomous_with_agent(agent, client, url, task, max_steps, screenshots="first_last"):
     steps = []
     
     try:
@@ -558,7 +819,7 @@ async def autonomous_process(api_key, url, task, max_steps):
             "step_number": 0,
             "action": f"Started session on {url}",
             "status": "CONTINUE",
-            "screenshot": session["screenshot"],
+            "screenshot": session["screenshot"] if screenshots != "none" else "",
             "message": "Session initialized"
         })
         
@@ -570,7 +831,9 @@ async def autonomous_process(api_key, url, task, max_steps):
         
         while status == "CONTINUE" and step <= max_steps:
             try:
-                result = await agent.execute_task(task, client)
+                result = await agent.execute_task(
+                    task, client, capture_screenshot=(screenshots == "all")
+                )
                 
                 # Check for repeated actions (prevent loops) - but allow some exploration
                 if result["action"] == last_action:
@@ -616,6 +879,14 @@ async def autonomous_process(api_key, url, task, max_steps):
                 status = "ERROR"
                 break
         
+        # In first_last mode intermediate steps carry no screenshot, so
+        # grab one final frame showing where the run ended up
+        if screenshots == "first_last" and len(steps) > 1:
+            try:
+                steps[-1]["screenshot"] = await agent.take_screenshot()
+            except Exception:
+                pass
+        
         return {
             'success': True,
             'type': 'autonomous',
@@ -628,8 +899,6 @@ async def autonomous_process(api_key, url, task, max_steps):
         
     except Exception as e:
         return {'success': False, 'error': str(e)}
-    finally:
-        await agent.close_session()
 
 if __name__ == '__main__':
     print("🚀 Starting Enhanced Web Agent (Scraping + Autonomous)...")
@@ -5,6 +5,7 @@ Claude Code - AI-powered code generation and assistance
 
 import os
 import sys
+import httpx
 from dotenv import load_dotenv
 from anthropic import Anthropic
 
@@ -20,12 +21,19 @@ def setup_claude():
         print("ANTHROPIC_API_KEY=your_api_key_here")
         sys.exit(1)
     
-    return Anthropic(api_key=api_key)
+    # No automatic retries and bounded timeouts so a stalled request
+    # fails fast instead of hanging the prompt loop
+    return Anthropic(
+        api_key=api_key,
+        max_retries=0,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+    )
 
 def generate_code(client, prompt):
-    """Generate code using Claude."""
+    """Generate code using Claude, streaming output as it arrives."""
     try:
-        response = client.messages.create(
+        parts = []
+        with client.messages.stream(
             model="claude-3-5-sonnet-20241022",
             max_tokens=4000,
             messages=[
@@ -34,16 +42,23 @@ def generate_code(client, prompt):
                     "content": f"Please generate code for the following request: {prompt}"
                 }
             ]
-        )
-        return response.content[0].text
+        ) as stream:
+            # Print tokens as they arrive - first output appears after one
+            # round-trip instead of after the full completion
+            for text in stream.text_stream:
+                print(text, end="", flush=True)
+                parts.append(text)
+        print()
+        return "".join(parts)
     except Exception as e:
         print(f"❌ Error generating code: {e}")
         return None
 
 def analyze_code(client, code):
-    """Analyze code using Claude."""
+    """Analyze code using Claude, streaming output as it arrives."""
     try:
-        response = client.messages.create(
+        parts = []
+        with client.messages.stream(
             model="claude-3-5-sonnet-20241022",
             max_tokens=2000,
             messages=[
@@ -52,8 +67,12 @@ def analyze_code(client, code):
                     "content": f"Please analyze this code and provide suggestions for improvement:\n\n{code}"
                 }
             ]
-        )
-        return response.content[0].text
+        ) as stream:
+            for text in stream.text_stream:
+                print(text, end="", flush=True)
+                parts.append(text)
+        print()
+        return "".join(parts)
     except Exception as e:
         print(f"❌ Error analyzing code: {e}")
         return None
@@ -74,18 +93,20 @@ def main():
         print("2. Analyze existing code")
         print("3. Exit")
         
-        choice = input("\nEnter your choice (1-3): ").strip()
+        try:
+            choice = input("\nEnter your choice (1-3): ").strip()
+        except EOFError:
+            # stdin closed (e.g. after Ctrl-D code entry or piped input)
+            print("\n👋 Goodbye!")
+            break
         
         if choice == "1":
             prompt = input("\nDescribe the code you want to generate: ")
-            print("\n🔄 Generating code...")
+            print("\n🔄 Generating code...\n")
+            print("-" * 40)
             result = generate_code(client, prompt)
+            print("-" * 40)
             if result:
-                print("\n✅ Generated code:")
-                print("-" * 40)
-                print(result)
-                print("-" * 40)
-                
                 save = input("\nSave to file? (y/n): ").lower().strip()
                 if save == 'y':
                     filename = input("Enter filename: ")
@@ -97,23 +118,15 @@ def main():
                         print(f"❌ Error saving file: {e}")
         
         elif choice == "2":
-            print("\nEnter your code (press Enter twice to finish):")
-            lines = []
-            while True:
-                line = input()
-                if line == "" and lines and lines[-1] == "":
-                    break
-                lines.append(line)
-            
-            code = "\n".join(lines[:-1])  # Remove the last empty line
+            print("\nPaste your code, then press Ctrl-D (Unix) or Ctrl-Z+Enter (Windows):")
+            # One buffered read instead of an input() round-trip per line -
+            # this also stops two early blank lines from truncating the paste
+            code = sys.stdin.read()
             if code.strip():
-                print("\n🔄 Analyzing code...")
-                result = analyze_code(client, code)
-                if result:
-                    print("\n✅ Code analysis:")
-                    print("-" * 40)
-                    print(result)
-                    print("-" * 40)
+                print("\n🔄 Analyzing code...\n")
+                print("-" * 40)
+                analyze_code(client, code)
+                print("-" * 40)
             else:
                 print("❌ No code provided.")
         
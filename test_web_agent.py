@@ -6,17 +6,36 @@ Test script for the Web Scraper Agent
 import asyncio
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pydantic import BaseModel
 from helper import get_openai_api_key
-import nest_asyncio
+import httpx
 from playwright.async_api import async_playwright
+from selectolax.parser import HTMLParser
+import tiktoken
 
 # Load environment variables
 load_dotenv()
 
-# Apply nest_asyncio to allow running in Jupyter or other nested event loops
-nest_asyncio.apply()
+# Shared Playwright driver: starting it spawns the driver node process,
+# so do it once per process even if several agents are created.
+_PLAYWRIGHT = None
+_PLAYWRIGHT_LOCK = asyncio.Lock()
+
+async def get_playwright():
+    """Lazily start Playwright once and share it across agents"""
+    global _PLAYWRIGHT
+    async with _PLAYWRIGHT_LOCK:
+        if _PLAYWRIGHT is None:
+            _PLAYWRIGHT = await async_playwright().start()
+        return _PLAYWRIGHT
+
+async def shutdown_playwright():
+    """Stop the shared driver; must run while its event loop is alive"""
+    global _PLAYWRIGHT
+    if _PLAYWRIGHT is not None:
+        await _PLAYWRIGHT.stop()
+        _PLAYWRIGHT = None
 
 # Define the data models
 class DeeplearningCourse(BaseModel):
@@ -37,7 +56,7 @@ class WebScraperAgent:
         self.page = None
 
     async def init_browser(self):
-        self.playwright = await async_playwright().start()
+        self.playwright = await get_playwright()
         self.browser = await self.playwright.chromium.launch(
             headless=True,
             args=[
@@ -65,26 +84,69 @@ class WebScraperAgent:
         await self.page.wait_for_timeout(2000)  # Wait for dynamic content
         return await self.page.content()
 
-    async def take_screenshot(self, path="screenshot.png"):
-        await self.page.screenshot(path=path, full_page=True)
+    async def take_screenshot(self, path="screenshot.png", full_page=False):
+        # Viewport-sized by default: full-page captures of long pages are
+        # multi-MB transfers over the driver channel
+        await self.page.screenshot(path=path, full_page=full_page)
         return path
+
+    async def screenshot_region(self, selector, path="screenshot.png"):
+        """Screenshot only the element matching selector"""
+        element = await self.page.query_selector(selector)
+        if element:
+            await element.screenshot(path=path)
+            return path
+        return None
     
     async def screenshot_buffer(self):
         screenshot_bytes = await self.page.screenshot(type="png", full_page=False)
         return screenshot_bytes
 
     async def close(self):
+        # Close only this agent's browser; the shared driver stays up
         if self.browser:
             await self.browser.close()
-        if self.playwright:
-            await self.playwright.stop()
         self.playwright = None
         self.browser = None
         self.page = None
 
+_TOKEN_ENCODER = None
+
+def _truncate_tokens(text, max_tokens=120_000):
+    """Truncate at the model's actual token budget instead of the 150K-char
+    proxy, which under-uses the window on ASCII pages and overshoots the
+    cut on dense non-ASCII ones"""
+    global _TOKEN_ENCODER
+    if _TOKEN_ENCODER is None:
+        try:
+            _TOKEN_ENCODER = tiktoken.encoding_for_model("gpt-4o-mini-2024-07-18")
+        except Exception:
+            # Encoder unavailable (e.g. no network for the BPE table) -
+            # remember that and fall back to the character-count proxy
+            _TOKEN_ENCODER = False
+    if not _TOKEN_ENCODER:
+        return text[:150000]
+    tokens = _TOKEN_ENCODER.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return _TOKEN_ENCODER.decode(tokens[:max_tokens])
+
+def _clean_html(html):
+    """Strip scripts, styles and other non-content tags so the truncated
+    slice sent to the model is all content-bearing markup"""
+    try:
+        tree = HTMLParser(html)
+        tree.strip_tags(["script", "style", "noscript", "svg", "iframe"])
+        body = tree.body
+        cleaned = body.html if body is not None else tree.html
+        return cleaned or html
+    except Exception:
+        return html
+
 async def process_with_llm(client, html, instructions):
     """Process HTML content with OpenAI LLM"""
-    completion = client.beta.chat.completions.parse(
+    html = _clean_html(html)
+    completion = await client.beta.chat.completions.parse(
         model="gpt-4o-mini-2024-07-18",
         messages=[{
             "role": "system",
@@ -101,38 +163,13 @@ async def process_with_llm(client, html, instructions):
             Return ONLY valid JSON, no markdown or extra text."""
         }, {
             "role": "user",
-            "content": html[:150000]  # Truncate to stay under token limits
+            "content": _truncate_tokens(html)
         }],
         temperature=0.1,
         response_format=DeeplearningCourseList,
     )
     return completion.choices[0].message.parsed
 
-async def webscraper(client, scraper, target_url, instructions):
-    """Main web scraping function"""
-    result = None
-    screenshot = None
-    try:
-        # Scrape content and capture screenshot
-        print("🔍 Extracting HTML Content...")
-        html_content = await scraper.scrape_content(target_url)
-        
-        print("📸 Taking Screenshot...")
-        screenshot = await scraper.screenshot_buffer()
-        
-        # Save screenshot to file for verification
-        with open("test_screenshot.png", "wb") as f:
-            f.write(screenshot)
-        print("   Screenshot saved as test_screenshot.png")
-        
-        # Process content
-        print("🤖 Processing with LLM...")
-        result = await process_with_llm(client, html_content, instructions)
-        print("✅ Generated Structured Response")
-    except Exception as e:
-        print(f"❌ Error: {str(e)}")
-    
-    return result, screenshot
 
 async def main():
     """Main test function"""
@@ -150,8 +187,15 @@ async def main():
     
     print("✅ OpenAI API key configured")
     
-    # Initialize OpenAI client
-    client = OpenAI(api_key=api_key)
+    # Initialize OpenAI client (async + HTTP/2 so the parallel LLM calls
+    # overlap and share one connection)
+    client = AsyncOpenAI(
+        api_key=api_key,
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=8),
+        ),
+    )
     
     # Initialize scraper
     scraper = WebScraperAgent()
@@ -162,14 +206,44 @@ async def main():
     
     print(f"\n🌐 Target URL: {target_url}")
     
+    # Both tests read the same page - scrape it once, then run the two
+    # LLM calls in parallel (they are the long pole of the run)
+    result = result2 = None
+    try:
+        print("\n🔍 Extracting HTML Content...")
+        html_content = await scraper.scrape_content(target_url)
+        
+        print("📸 Taking Screenshot...")
+        screenshot = await scraper.screenshot_buffer()
+        
+        # Save screenshot to file for verification
+        with open("test_screenshot.png", "wb") as f:
+            f.write(screenshot)
+        print("   Screenshot saved as test_screenshot.png")
+        
+        instructions = "Get all the courses"
+        subject = "Retrieval Augmented Generation (RAG)"
+        instructions2 = f"""
+        Read the description of the courses and only 
+        provide the three courses that are about {subject}. 
+        Make sure that we don't have any other
+        courses in the output
+        """
+        
+        print("🤖 Processing with LLM (both tests in parallel)...")
+        result, result2 = await asyncio.gather(
+            process_with_llm(client, html_content, instructions),
+            process_with_llm(client, html_content, instructions2),
+        )
+        print("✅ Generated Structured Responses")
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+    
     # Test 1: Get all courses
     print("\n" + "=" * 60)
     print("📋 Test 1: Fetching all courses")
     print("=" * 60)
     
-    instructions = "Get all the courses"
-    result, screenshot = await webscraper(client, scraper, target_url, instructions)
-    
     if result and hasattr(result, 'courses'):
         print(f"\n✅ Successfully found {len(result.courses)} courses!")
         print("\n📚 First 3 courses:")
@@ -185,16 +259,6 @@ async def main():
     print("📋 Test 2: Filtering for RAG courses")
     print("=" * 60)
     
-    subject = "Retrieval Augmented Generation (RAG)"
-    instructions = f"""
-    Read the description of the courses and only 
-    provide the three courses that are about {subject}. 
-    Make sure that we don't have any other
-    courses in the output
-    """
-    
-    result2, screenshot2 = await webscraper(client, scraper, target_url, instructions)
-    
     if result2 and hasattr(result2, 'courses'):
         print(f"\n✅ Found {len(result2.courses)} RAG-related courses!")
         for i, course in enumerate(result2.courses, 1):
@@ -205,6 +269,7 @@ async def main():
     
     # Clean up
     await scraper.close()
+    await shutdown_playwright()
     print("\n" + "=" * 60)
     print("✅ Test completed successfully!")
     print("=" * 60)